@@ -1,14 +1,12 @@
 #!/usr/bin/env python3
 
-import string
 import os
 import sys
-import csv
 import cmd
-import logging
-import ipdb
+import functools
+import mmap
 
-from unidecode import unidecode
+import numpy as np
 
 # Constraints / hints:
 # Can be of type either:
@@ -16,22 +14,127 @@ from unidecode import unidecode
 #   Yellow: (index, letter)
 #   Grey: (letter)
 
+def pack_bits(masks):
+    """Pack bool `masks` along their last axis into little-endian uint64 bitmaps (word k is bit k % 64 of block k // 64).
+
+    The last axis is padded with False up to a multiple of 64.
+    """
+    padding = -masks.shape[-1] % 64
+    if padding:
+        masks = np.concatenate([masks, np.zeros(masks.shape[:-1] + (padding,), dtype=bool)], axis=-1)
+    return np.packbits(masks, axis=-1, bitorder='little').view('<u8')
+
+def position_letter_masks(col):
+    """(5, 26, N) bool array: `[i, c, k]` is whether word k has letter `chr(ord('a') + c)` at position i.
+
+    `col` is the column-major (5, N) word array, so each comparison is a linear scan of one position.
+    """
+    letters = np.arange(ord('a'), ord('z') + 1, dtype=np.uint8)
+    return col[:, None, :] == letters[None, :, None]
+
+class WordMatrix(object):
+    """A word list preprocessed into flat arrays that constraints can be vectorized against.
+
+    Sets of words are represented as uint64 bitmaps (see `pack_bits`), so combining constraints is a handful of ANDs
+    over N / 64 integers.
+    """
+    def __init__(self, word_arr):
+        # One contiguous (N, 5) byte matrix, plus derived bitmap lookup tables.
+        self.word_arr = word_arr
+        # the same bytes column-major: col[i] is a contiguous array of every word's i'th letter
+        self.col = np.ascontiguousarray(word_arr.T)
+        # pos_bits[i, c]: words with letter c at position i; letter_bits[c]: words containing letter c anywhere
+        pos_masks = position_letter_masks(self.col)
+        self.pos_bits = pack_bits(pos_masks)
+        self.letter_bits = np.bitwise_or.reduce(self.pos_bits, axis=0)
+        # counts[c, k]: how many times letter c occurs in word k; repeated_bits[c]: words with c at least twice
+        self.counts = pos_masks.sum(axis=0, dtype=np.uint8)
+        self.repeated_bits = pack_bits(self.counts >= 2)
+
+    @classmethod
+    def from_words(cls, words):
+        """Table for a list of 5-letter ASCII str."""
+        return cls(np.frombuffer(''.join(words).encode('ascii'), dtype=np.uint8).reshape(-1, 5))
+
+    def __len__(self):
+        return len(self.word_arr)
+
+    def pack(self, mask):
+        """Bitmap of the (N,) bool array `mask`."""
+        return pack_bits(mask)
+
+    def unpack(self, bitmap):
+        """(N,) bool array of the words set in `bitmap`."""
+        return np.unpackbits(bitmap.view(np.uint8), count=len(self), bitorder='little').view(bool)
+
+    def all_words(self):
+        """Bitmap with every word set."""
+        return self.pack(np.ones(len(self), dtype=bool))
+
+    def words(self, bitmap):
+        """The words set in `bitmap`, as a list of str."""
+        data = self.word_arr[self.unpack(bitmap)].tobytes().decode('ascii')
+        return [data[i:i + 5] for i in range(0, len(data), 5)]
+
+def read_word_matrix(filename):
+    """Load the 5-letter words of a whitespace-separated word file straight into a WordMatrix.
+
+    The file is mmapped and scanned with NumPy, never creating a str per word.  Returns None if the file isn't pure
+    ASCII (or is empty), in which case the caller has to go through unidecode instead.
+    """
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = np.frombuffer(mm, dtype=np.uint8)
+            try:
+                if (data >= 0x80).any():
+                    return None
+                # Offsets of every whitespace byte, bracketed by virtual separators before and after the file.
+                is_space = np.zeros(256, dtype=bool)
+                is_space[list(b' \t\n\r\v\f')] = True
+                seps = np.concatenate([[-1], np.flatnonzero(is_space[data]), [len(data)]])
+                starts = seps[:-1][np.diff(seps) == 6] + 1
+                # fancy indexing copies, so nothing refers to the mmap once it's closed
+                word_arr = data[starts[:, None] + np.arange(5)]
+            finally:
+                del data
+    return WordMatrix(word_arr)
+
+def letter_ord(letter):
+    """Byte value of `letter` lowercased, which must be a single ASCII letter."""
+    # Setting 0x20 lowercases A-Z, and leaves exactly a-z inside the range check.
+    b = ord(letter) | 0x20 if len(letter) == 1 else 0
+    if not ord('a') <= b <= ord('z'):
+        raise ValueError(f"letter \"{letter}\" is not a valid letter")
+    return b
+
 class BaseConstraint(object):
+    """Constraints are immutable once constructed, so identical ones can be shared (see `make_constraint`)."""
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
     def matches(self, word):
         raise NotImplementedError
 
-    def filter_function(self):
-        return lambda word: self.matches(word)
+    def bitmap(self, table):
+        """Vectorized `matches` over every word in the WordMatrix `table`, as a uint64 bitmap."""
+        raise NotImplementedError
 
 class BasePositionalConstraint(BaseConstraint):
+    __slots__ = ('index', 'letter', '_letter_ord')
+
     def __init__(self, index, letter):
-        if index not in range(0, 5):
+        if not (0 <= index < 5):
             raise ValueError(f"index {index} out of bounds")
-        if letter not in string.ascii_letters:
-            raise ValueError(f"letter \"{letter}\" is not a valid letter")
+        b = letter_ord(letter)
 
-        self.index = index
-        self.letter = letter.lower()
+        object.__setattr__(self, 'index', index)
+        object.__setattr__(self, 'letter', chr(b))
+        # precomputed for the vectorized paths
+        object.__setattr__(self, '_letter_ord', b)
 
     def __str__(self):
         return f"{type(self).__name__}({self.index}, {self.letter})"
@@ -40,11 +143,19 @@ class BasePositionalConstraint(BaseConstraint):
         return isinstance(other, type(self)) and \
                 (self.index, self.letter) == (other.index, other.letter)
 
+    def __hash__(self):
+        return hash((type(self), self.index, self.letter))
+
+    def __reduce__(self):
+        return type(self), (self.index, self.letter)
+
 class BaseNonPositionalConstraint(BaseConstraint):
+    __slots__ = ('letter', '_letter_ord')
+
     def __init__(self, letter):
-        if letter not in string.ascii_letters:
-            raise ValueError(f"letter \"{letter}\" is not a valid letter")
-        self.letter = letter.lower()
+        b = letter_ord(letter)
+        object.__setattr__(self, 'letter', chr(b))
+        object.__setattr__(self, '_letter_ord', b)
 
     def __str__(self):
         return f"{type(self).__name__}({self.letter})"
@@ -53,23 +164,45 @@ class BaseNonPositionalConstraint(BaseConstraint):
         return isinstance(other, type(self)) and \
                 self.letter == other.letter
 
+    def __hash__(self):
+        return hash((type(self), self.letter))
+
+    def __reduce__(self):
+        return type(self), (self.letter,)
+
 class GreenConstraint(BasePositionalConstraint):
+    __slots__ = ()
+
     def matches(self, word):
         index, letter = (self.index, self.letter)
         return word[index] == letter
 
+    def bitmap(self, table):
+        return table.pos_bits[self.index, self._letter_ord - ord('a')]
+
 class YellowConstraint(BasePositionalConstraint):
+    __slots__ = ()
+
     def matches(self, word):
         index, letter = (self.index, self.letter)
         return (letter in word) and (word[index] != letter)
 
+    def bitmap(self, table):
+        c = self._letter_ord - ord('a')
+        return table.letter_bits[c] & ~table.pos_bits[self.index, c]
+
 
 class NoLetterPresentConstraint(BaseNonPositionalConstraint):
     """A standard "grey" constraint meaning a letter isn't present."""
+    __slots__ = ()
+
     def matches(self, word):
         letter = self.letter
         return letter not in word
 
+    def bitmap(self, table):
+        return ~table.letter_bits[self._letter_ord - ord('a')]
+
 
 class LetterNotRepeatedConstraint(BaseNonPositionalConstraint):
     """A "grey" constraint can, in the case of repeated letters, mean the letter isn't repeated a second time.
@@ -80,10 +213,21 @@ class LetterNotRepeatedConstraint(BaseNonPositionalConstraint):
     I don't know what behaviour Wordle would have if there were 3 copies of a letter - without code diving into Wordle
     (which I'm purposely avoiding) it's an undefined hypothetical.
     """
+    __slots__ = ()
+
     def matches(self, word):
         letter = self.letter
         return word.count(letter) < 2
 
+    def bitmap(self, table):
+        return ~table.repeated_bits[self._letter_ord - ord('a')]
+
+
+@functools.lru_cache(maxsize=512)
+def make_constraint(constraint_type, *args):
+    """A shared instance of `constraint_type(*args)`, reused across guesses that produce the same hint."""
+    return constraint_type(*args)
+
 
 class WordleShell(cmd.Cmd):
     intro = """Wordle solver.
@@ -96,17 +240,28 @@ class WordleShell(cmd.Cmd):
     prompt = '(wordle) '
 
     def __init__(self, words):
-        self.words = words
+        self.table = words if isinstance(words, WordMatrix) else WordMatrix.from_words(words)
+        # bitmap of which words of the table are still possible
+        self.alive_bits = self.table.all_words()
         self.constraints = []
-        super().__init__()
-    
+        # letters that have come back green or yellow, to tell "not present" greys from "not repeated" ones
+        self._colored_letters = set()
+        # Tab completion is only useful interactively, and skipping it avoids importing readline for piped input.
+        super().__init__(completekey='tab' if sys.stdin.isatty() else None)
+
+    def remaining_words(self):
+        return self.table.words(self.alive_bits)
+
+    def num_remaining(self):
+        return int(np.count_nonzero(self.table.unpack(self.alive_bits)))
+
     def do_status(self, arg):
         "Print number of remaining possible words."
-        print(f"Number of possible words remaining: {len(self.words)}")
+        print(f"Number of possible words remaining: {self.num_remaining()}")
 
     def do_possible(self, arg):
         "Print all remaining possible words."
-        print("\n".join(self.words))
+        print("\n".join(self.remaining_words()))
 
     def do_word(self, arg):
         """Add a word and its green/yellow/gray results: word prion g_yy_
@@ -118,26 +273,32 @@ class WordleShell(cmd.Cmd):
         if len(hints) != 5:
             raise ValueError("hints should be 5 chars long")
 
+        new_constraints = []
+        new_colored_letters = set()
+
         for i in range(0, 5):
             letter = word[i]
             constraint_type = hints[i]
 
             if constraint_type == "g":
-                constraint = GreenConstraint(i, letter)
+                constraint = make_constraint(GreenConstraint, i, letter)
+                new_colored_letters.add(constraint.letter)
             elif constraint_type == "y":
-                constraint = YellowConstraint(i, letter)
+                constraint = make_constraint(YellowConstraint, i, letter)
+                new_colored_letters.add(constraint.letter)
             elif constraint_type == "_":
                 # Check if this is a "none of this letter" result, or a "not repeated" type result:
-                if any([c.letter == letter and (isinstance(c, GreenConstraint) or isinstance(c, YellowConstraint))
-                        for c in self.constraints]):
-                    constraint = LetterNotRepeatedConstraint(letter)
+                if letter.lower() in self._colored_letters or letter.lower() in new_colored_letters:
+                    constraint = make_constraint(LetterNotRepeatedConstraint, letter)
                 else:
-                    constraint = NoLetterPresentConstraint(letter)
+                    constraint = make_constraint(NoLetterPresentConstraint, letter)
             else:
                 raise ValueError(f"invalid hint type \"{constraint_type}\" at position {i}")
-            self.apply_new_constraint(constraint)
+            new_constraints.append(constraint)
+
+        self.apply_batch(new_constraints)
 
-        print(f"Number of possible words remaining: {len(self.words)}")
+        print(f"Number of possible words remaining: {self.num_remaining()}")
 
     def do_exit(self, arg):
         "Close this program."
@@ -146,11 +307,29 @@ class WordleShell(cmd.Cmd):
     def do_EOF(self, arg):
         sys.exit(0)
 
+    def apply_batch(self, constraints):
+        """Fuse `constraints` into one pass of bitmap ANDs over the remaining words."""
+        # Plain grey results are all folded into a single forbidden-letters bitmap.
+        forbidden = []
+        bitmaps = []
+        for constraint in constraints:
+            print(f"[DEBUG] Applying new constraint {constraint}")
+            self.constraints.append(constraint)
+            if isinstance(constraint, (GreenConstraint, YellowConstraint)):
+                self._colored_letters.add(constraint.letter)
+            if isinstance(constraint, NoLetterPresentConstraint):
+                forbidden.append(constraint._letter_ord - ord('a'))
+            else:
+                bitmaps.append(constraint.bitmap(self.table))
+        if forbidden:
+            bitmaps.append(~np.bitwise_or.reduce(self.table.letter_bits[forbidden], axis=0))
+
+        for bitmap in bitmaps:
+            self.alive_bits &= bitmap
+        print(f"[DEBUG] Words after: #{self.num_remaining()}")
+
     def apply_new_constraint(self, constraint):
-        print(f"[DEBUG] Applying new constraint {constraint}")
-        self.constraints.append(constraint)
-        self.words = list(filter(constraint.filter_function(), self.words))
-        print(f"[DEBUG] Words after: #{len(self.words)}")
+        self.apply_batch([constraint])
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
@@ -158,11 +337,16 @@ if __name__ == "__main__":
     else:
         filename = "en_words.txt"
 
-    with open(filename) as f:
-        all_words = f.read().split()
-    all_words = list(filter(lambda word: len(word) == 5, all_words))
-
-    # massage out accents
-    all_words = [unidecode(w) for w in all_words]
+    all_words = read_word_matrix(filename)
+    if all_words is None:
+        with open(filename) as f:
+            all_words = f.read().split()
+
+        # massage out accents (unidecode is only imported if some word actually needs it)
+        if not all(w.isascii() for w in all_words):
+            from unidecode import unidecode
+            all_words = [w if w.isascii() else unidecode(w) for w in all_words]
+        # filter on length after unidecode, since transliteration can change it (e.g. "ß" -> "ss")
+        all_words = list(filter(lambda word: len(word) == 5, all_words))
 
     WordleShell(all_words).cmdloop()